@@ -12,6 +12,7 @@ class DataConfiguration:
     SAVE_DATA_PATH_DYNAMIC_SAMPLED = os.path.abspath(
         os.path.join(__file__, "../../data/preprocessed-skyscrapers-dynamic-sampled")
     )
+    WATERTIGHT_CACHE_PATH = os.path.abspath(os.path.join(__file__, "../../data/watertight-cache"))
 
     N_TOTAL_SAMPLING = 64**3
     N_SURFACE_SAMPLING_RATIO = 0.3
@@ -30,6 +31,9 @@ class DataConfiguration:
     ) == N_TOTAL_SAMPLING, "The sum of sampling `n` is not equal to `n_total_sampling`"
 
     RECONSTRUCT_RESOLUTION = 512
+    RECONSTRUCT_BATCH_SIZE = 2**16
+
+    SDF_QUERY_CHUNK_SIZE = 2**16
 
     DYNAMIC_SAMPLING_DIVIDER = 100000
 
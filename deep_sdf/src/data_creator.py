@@ -1,4 +1,8 @@
 import os
+import numba
+import warnings
+import torch
+import hashlib
 import trimesh
 import numpy as np
 import multiprocessing
@@ -10,6 +14,96 @@ from deep_sdf.src import utils
 from deep_sdf.src.config import Configuration
 
 
+@numba.njit(parallel=True, fastmath=True, cache=True)
+def _add_barycentric_points(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    triangle_indices: np.ndarray,
+    r1: np.ndarray,
+    r2: np.ndarray,
+    out: np.ndarray,
+) -> None:
+    """Add points sampled on the given triangles to `out` in a single pass, without intermediate arrays
+
+    Args:
+        vertices (np.ndarray): mesh vertices
+        faces (np.ndarray): mesh faces
+        triangle_indices (np.ndarray): index of the triangle for each point
+        r1 (np.ndarray): square root of uniform random values for each point
+        r2 (np.ndarray): uniform random values for each point
+        out (np.ndarray): output points (shape: [num_points, 3])
+    """
+
+    for i in numba.prange(triangle_indices.shape[0]):
+        t = triangle_indices[i]
+        a, b, c = faces[t, 0], faces[t, 1], faces[t, 2]
+        wa = 1 - r1[i]
+        wb = r1[i] * (1 - r2[i])
+        wc = r1[i] * r2[i]
+
+        for j in range(3):
+            out[i, j] += wa * vertices[a, j] + wb * vertices[b, j] + wc * vertices[c, j]
+
+
+@numba.njit(cache=True)
+def _build_alias_table(weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Build the alias table with Vose's method to sample indices proportionally to the weights in O(1)
+
+    Args:
+        weights (np.ndarray): non-negative weights such as the areas of faces
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: probabilities, aliases
+    """
+
+    n = weights.shape[0]
+    prob = weights * (n / weights.sum())
+    alias = np.arange(n)
+
+    # Stacks of the indices whose probabilities are below and above the average
+    small = np.empty(n, dtype=np.int64)
+    large = np.empty(n, dtype=np.int64)
+    n_small = 0
+    n_large = 0
+    for i in range(n):
+        if prob[i] < 1.0:
+            small[n_small] = i
+            n_small += 1
+        else:
+            large[n_large] = i
+            n_large += 1
+
+    while n_small > 0 and n_large > 0:
+        n_small -= 1
+        n_large -= 1
+        s = small[n_small]
+        g = large[n_large]
+
+        alias[s] = g
+        prob[g] = prob[g] + prob[s] - 1.0
+
+        if prob[g] < 1.0:
+            small[n_small] = g
+            n_small += 1
+        else:
+            large[n_large] = g
+            n_large += 1
+
+    # Leftovers are only due to floating point errors
+    for i in range(n_small):
+        prob[small[i]] = 1.0
+    for i in range(n_large):
+        prob[large[i]] = 1.0
+
+    return prob, alias
+
+
+def _init_sdf_data_worker() -> None:
+    """Limit each pool worker to a single numba thread, since the pool already uses all cores"""
+
+    numba.set_num_threads(1)
+
+
 class DataCreatorHelper:
     MIN_BOUND = "min_bound"
     CENTER = "center"
@@ -17,6 +111,12 @@ class DataCreatorHelper:
 
     TYPES = Union[MIN_BOUND, CENTER, CENTER_WITHOUT_Z]
 
+    PCU = "pcu"
+    IGL = "igl"
+    KAOLIN = "kaolin"
+
+    SDF_BACKENDS = Union[PCU, IGL, KAOLIN]
+
     @staticmethod
     def load_mesh_and_compute_max_norm(
         path: str,
@@ -80,14 +180,12 @@ class DataCreatorHelper:
             trimesh.Trimesh: Normalized mesh
         """
 
-        mesh = _mesh.copy()
-
         if max_length is not None:
             length = max_length
         else:
-            length = np.max(np.linalg.norm(mesh.vertices, axis=1))
+            length = np.max(np.linalg.norm(_mesh.vertices, axis=1))
 
-        mesh.vertices = mesh.vertices * (1.0 / length)
+        mesh = trimesh.Trimesh(vertices=_mesh.vertices * (1.0 / length), faces=_mesh.faces, process=False)
 
         return mesh
 
@@ -102,11 +200,37 @@ class DataCreatorHelper:
             trimesh.Trimesh: The potentially closed mesh.
         """
 
-        mesh = _mesh.copy()
+        mesh = trimesh.Trimesh(vertices=_mesh.vertices.copy(), faces=_mesh.faces.copy(), process=False)
         mesh.fill_holes()
 
         return mesh
 
+    @staticmethod
+    def _get_face_alias_table(mesh: trimesh.Trimesh) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the alias table to sample faces proportionally to their areas, computed in a single vectorized pass.
+        It is kept in the mesh cache, which trimesh clears when the vertices or faces change.
+
+        Args:
+            mesh (trimesh.Trimesh): mesh to sample faces from
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: probabilities, aliases
+        """
+
+        alias_table = mesh._cache["face_alias_table"]
+        if alias_table is None:
+            vertices = mesh.vertices.view(np.ndarray)
+            faces = mesh.faces.view(np.ndarray)
+
+            cross = np.cross(
+                vertices[faces[:, 1]] - vertices[faces[:, 0]], vertices[faces[:, 2]] - vertices[faces[:, 0]]
+            )
+
+            alias_table = _build_alias_table(np.linalg.norm(cross, axis=1) * 0.5)
+            mesh._cache["face_alias_table"] = alias_table
+
+        return alias_table
+
     @staticmethod
     def sample_pts(
         mesh: trimesh.Trimesh,
@@ -115,6 +239,7 @@ class DataCreatorHelper:
         n_volume_sampling: int,
         sigma: float = 0.01,
         with_surface_points_noise: bool = True,
+        seed: Union[int, np.random.SeedSequence] = None,
     ) -> np.ndarray:
         """
         Sample a given number of points uniformly from the surface of a mesh.
@@ -124,6 +249,8 @@ class DataCreatorHelper:
             n_surface_sampling (int): The number of points to sample from the surface.
             n_bbox_sampling (int): The number of points to sample from the bounding box.
             n_volume_sampling (int): The number of points to sample from the volume.
+            seed (Union[int, np.random.SeedSequence], optional): seed of the sampling. Defaults to None, which
+                draws one from the global state.
 
         Returns:
             np.ndarray: An array of sampled points (shape: [num_samples, 3]).
@@ -132,17 +259,78 @@ class DataCreatorHelper:
         if not with_surface_points_noise:
             sigma = 0
 
-        surface_points_sampled, _ = trimesh.sample.sample_surface(mesh, n_surface_sampling)
-        surface_points_sampled += np.random.normal(0, sigma, surface_points_sampled.shape)
+        if seed is None:
+            seed = np.random.randint(np.iinfo(np.int32).max)
 
-        bbox_points_sampled = np.random.uniform(low=mesh.bounds[0], high=mesh.bounds[1], size=[n_bbox_sampling, 3])
+        rng = np.random.default_rng(seed)
 
-        volume_points_sampled = np.random.rand(n_volume_sampling, 3)
+        # Pick triangles proportionally to their areas, then sample uniformly within each triangle
+        prob, alias = DataCreatorHelper._get_face_alias_table(mesh)
+        k = rng.integers(prob.shape[0], size=n_surface_sampling)
+        triangle_indices = np.where(rng.random(n_surface_sampling) < prob[k], k, alias[k])
 
-        xyz = np.concatenate([surface_points_sampled, bbox_points_sampled, volume_points_sampled], axis=0)
+        r1 = np.sqrt(rng.random(n_surface_sampling))
+        r2 = rng.random(n_surface_sampling)
+
+        # All samples are written directly into their slices of a single buffer
+        xyz = np.empty((n_surface_sampling + n_bbox_sampling + n_volume_sampling, 3))
+        surface_points_sampled = xyz[:n_surface_sampling]
+        bbox_points_sampled = xyz[n_surface_sampling : n_surface_sampling + n_bbox_sampling]
+        volume_points_sampled = xyz[n_surface_sampling + n_bbox_sampling :]
+
+        rng.standard_normal(out=surface_points_sampled)
+        surface_points_sampled *= sigma
+
+        _add_barycentric_points(
+            mesh.vertices.view(np.ndarray),
+            mesh.faces.view(np.ndarray),
+            triangle_indices,
+            r1,
+            r2,
+            surface_points_sampled,
+        )
+
+        rng.random(out=bbox_points_sampled)
+        bbox_points_sampled *= mesh.bounds[1] - mesh.bounds[0]
+        bbox_points_sampled += mesh.bounds[0]
+
+        rng.random(out=volume_points_sampled)
 
         return xyz
 
+    @staticmethod
+    def get_watertight_cache_path(path: str, cache_dir: str = Configuration.WATERTIGHT_CACHE_PATH) -> str:
+        """Get the path to cache the watertight mesh, keyed by the path, size and modification time of the mesh file
+        so that looking it up does not read the file
+
+        Args:
+            path (str): mesh path
+            cache_dir (str, optional): Defaults to Configuration.WATERTIGHT_CACHE_PATH.
+
+        Returns:
+            str: cache path
+        """
+
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha1(key.encode()).hexdigest()
+
+        return os.path.join(cache_dir, f"{digest}.npz")
+
+    @staticmethod
+    def load_watertight_mesh_data(cache_path: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Load the cached watertight mesh
+
+        Args:
+            cache_path (str): cache path
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: vertices, faces
+        """
+
+        with np.load(cache_path) as data:
+            return data["vertices"], data["faces"]
+
     @staticmethod
     def load_mesh(
         path: str,
@@ -163,34 +351,56 @@ class DataCreatorHelper:
             trimesh.Trimesh: Loaded mesh
         """
 
-        mesh = trimesh.load(path)
+        watertight_cache_path = None
+        if check_watertight:
+            watertight_cache_path = DataCreatorHelper.get_watertight_cache_path(path)
 
-        if isinstance(mesh, trimesh.Scene):
-            geo_list = []
-            for g in mesh.geometry.values():
-                geo_list.append(g)
-            mesh = trimesh.util.concatenate(geo_list)
+        if watertight_cache_path is not None and os.path.exists(watertight_cache_path):
+            # The mesh has already been made watertight, so skip loading and checking it again
+            vertices, faces = DataCreatorHelper.load_watertight_mesh_data(watertight_cache_path)
 
-        mesh.fix_normals(multibody=True)
-
-        if check_watertight and not mesh.is_watertight:
-            vertices, faces = pcu.make_mesh_watertight(mesh.vertices, mesh.faces, resolution=100000)
-            mesh = trimesh.Trimesh(vertices=vertices, faces=faces)
+        else:
+            # Only vertices and faces are used, so skip materials and flatten scenes into a single mesh.
+            # Processing is kept to merge the vertices split by the .obj loader, otherwise closed meshes look open
+            loaded_mesh = trimesh.load(path, force="mesh", skip_materials=True)
+
+            vertices = np.array(loaded_mesh.vertices)
+            faces = loaded_mesh.faces.view(np.ndarray)
+
+            if check_watertight:
+                if loaded_mesh.is_watertight:
+                    # Fix inconsistent winding and inverted bodies, which flip the signs of pseudonormal-based sdf
+                    loaded_mesh.fix_normals(multibody=True)
+                    faces = loaded_mesh.faces.view(np.ndarray)
+                else:
+                    # `make_mesh_watertight` returns a consistently oriented mesh
+                    vertices, faces = pcu.make_mesh_watertight(vertices, faces, resolution=100000)
+
+                    # Written to a temporary file first so that an interrupted write never leaves a truncated cache
+                    os.makedirs(os.path.dirname(watertight_cache_path), exist_ok=True)
+                    temp_cache_path = f"{os.path.splitext(watertight_cache_path)[0]}.{os.getpid()}.tmp.npz"
+                    np.savez_compressed(temp_cache_path, vertices=vertices, faces=faces)
+                    os.replace(temp_cache_path, watertight_cache_path)
 
         if map_z_to_y:
-            mesh.vertices[:, [1, 2]] = mesh.vertices[:, [2, 1]]
+            vertices[:, [1, 2]] = vertices[:, [2, 1]]
+
+        vertices_min = vertices.min(axis=0)
+        vertices_max = vertices.max(axis=0)
 
         if translate_mode == DataCreatorHelper.MIN_BOUND:
-            vector = mesh.bounds[0]
+            vector = vertices_min
         elif translate_mode == DataCreatorHelper.CENTER:
-            vector = np.mean(mesh.vertices, axis=0)
+            vector = np.mean(vertices, axis=0)
         elif translate_mode == DataCreatorHelper.CENTER_WITHOUT_Z:
-            vector = mesh.bounds.sum(axis=0) * 0.5
-            vector[2] = mesh.bounds[0][2]
+            vector = (vertices_min + vertices_max) * 0.5
+            vector[2] = vertices_min[2]
         else:
             raise ValueError(f"Invalid translate mode: {translate_mode}")
 
-        mesh.vertices -= vector
+        vertices -= vector
+
+        mesh = trimesh.Trimesh(vertices=vertices, faces=np.ascontiguousarray(faces), process=False)
 
         if normalize:
             mesh = DataCreatorHelper.get_normalized_mesh(mesh, max_length=max_length)
@@ -199,6 +409,140 @@ class DataCreatorHelper:
 
         return mesh
 
+    @staticmethod
+    def compute_sdf(
+        xyz: np.ndarray,
+        vertices: np.ndarray,
+        faces: np.ndarray,
+        sdf_backend: SDF_BACKENDS = IGL,
+        chunk_size: int = Configuration.SDF_QUERY_CHUNK_SIZE,
+    ) -> np.ndarray:
+        """Compute signed distances from the given points to the mesh (negative inside)
+
+        Args:
+            xyz (np.ndarray): query points
+            vertices (np.ndarray): mesh vertices
+            faces (np.ndarray): mesh faces
+            sdf_backend (Union[PCU, IGL, KAOLIN], optional): Defaults to IGL. Falls back to PCU if unavailable.
+            chunk_size (int, optional): number of query points per chunk on the GPU.
+                Defaults to Configuration.SDF_QUERY_CHUNK_SIZE.
+
+        Returns:
+            np.ndarray: signed distances (shape: [num_points])
+        """
+
+        if sdf_backend not in (DataCreatorHelper.PCU, DataCreatorHelper.IGL, DataCreatorHelper.KAOLIN):
+            raise ValueError(f"Invalid sdf backend: {sdf_backend}")
+
+        # Without CUDA or the library, kaolin and igl fall through to pcu below
+        if sdf_backend == DataCreatorHelper.KAOLIN and torch.cuda.is_available():
+            try:
+                import kaolin
+
+                vertices_cuda = torch.from_numpy(np.asarray(vertices)).float().cuda().unsqueeze(0)
+                faces_cuda = torch.from_numpy(np.asarray(faces)).long().cuda()
+                face_vertices = kaolin.ops.mesh.index_vertices_by_faces(vertices_cuda, faces_cuda)
+
+                # Query points are streamed in chunks, reusing the mesh tensors, to bound the working set
+                sdf = np.empty(xyz.shape[0], dtype=np.float32)
+                for i in range(0, xyz.shape[0], chunk_size):
+                    xyz_cuda = torch.from_numpy(xyz[i : i + chunk_size]).float().cuda().unsqueeze(0)
+
+                    squared_distance, *_ = kaolin.metrics.trianglemesh.point_to_mesh_distance(xyz_cuda, face_vertices)
+                    is_inside = kaolin.ops.mesh.check_sign(vertices_cuda, faces_cuda, xyz_cuda)
+
+                    sdf_chunk = torch.sqrt(squared_distance) * torch.where(is_inside, -1.0, 1.0)
+                    sdf[i : i + chunk_size] = sdf_chunk.squeeze(0).cpu().numpy()
+
+                return sdf
+
+            except ImportError:
+                pass
+
+        elif sdf_backend == DataCreatorHelper.IGL:
+            try:
+                import igl
+
+                sdf, *_ = igl.signed_distance(xyz, np.asarray(vertices, dtype=xyz.dtype), np.asarray(faces))
+
+                return sdf
+
+            except ImportError:
+                pass
+
+        if sdf_backend != DataCreatorHelper.PCU:
+            warnings.warn(f"sdf backend {sdf_backend} is unavailable (not installed or no CUDA), falling back to pcu")
+
+        sdf, *_ = pcu.signed_distance_to_mesh(xyz, vertices, faces)
+
+        return sdf
+
+    @staticmethod
+    def create_sdf_data(
+        task: Tuple[np.ndarray, np.ndarray, str, int, float, int, int, int, bool, str, str, np.random.SeedSequence],
+    ) -> str:
+        """Sample points from the given mesh, compute their sdf values and save them as .npz
+
+        Args:
+            task (Tuple[np.ndarray, np.ndarray, str, int, float, int, int, int, bool, str, str, SeedSequence]):
+                vertices, faces, path, cls, max length, sampling sizes (surface, bbox, volume), dynamic sampling,
+                save path, sdf backend and sampling seed
+
+        Returns:
+            str: saved .npz path
+        """
+
+        (
+            vertices,
+            faces,
+            path,
+            cls,
+            max_length,
+            n_surface_sampling,
+            n_bbox_sampling,
+            n_volume_sampling,
+            dynamic_sampling,
+            save_path,
+            sdf_backend,
+            seed,
+        ) = task
+
+        centralized_mesh = trimesh.Trimesh(
+            vertices=vertices * (1.0 / max_length) + np.array([0.5, 0.5, 0]), faces=faces, process=False
+        )
+
+        if dynamic_sampling:
+            (
+                n_surface_sampling,
+                n_bbox_sampling,
+                n_volume_sampling,
+            ) = Configuration.get_dynamic_sampling_size(mesh_vertices_count=vertices.shape[0])
+
+        print(
+            f"mesh_vertices_count: {vertices.shape[0]}",
+            f"n_total_sampling: {n_surface_sampling + n_bbox_sampling + n_volume_sampling}",
+        )
+
+        xyz = DataCreatorHelper.sample_pts(
+            centralized_mesh, n_surface_sampling, n_bbox_sampling, n_volume_sampling, seed=seed
+        )
+
+        sdf = DataCreatorHelper.compute_sdf(xyz, centralized_mesh.vertices, centralized_mesh.faces, sdf_backend)
+        sdf = np.expand_dims(sdf, axis=1)
+
+        cls_name = os.path.basename(path).split(".")[0]
+        npz_path = os.path.join(save_path, f"{cls_name}.npz")
+
+        np.savez(
+            npz_path,
+            xyz=xyz,
+            sdf=sdf,
+            cls=cls,
+            cls_name=cls_name,
+        )
+
+        return npz_path
+
 
 class DataCreator(DataCreatorHelper):
     def __init__(
@@ -211,11 +555,13 @@ class DataCreator(DataCreatorHelper):
         translate_mode: str,
         dynamic_sampling: bool,
         is_debug_mode: bool = False,
+        sdf_backend: DataCreatorHelper.SDF_BACKENDS = DataCreatorHelper.IGL,
     ) -> None:
         self.raw_data_path = raw_data_path
         self.save_path = save_path
         self.translate_mode = translate_mode
         self.dynamic_sampling = dynamic_sampling
+        self.sdf_backend = sdf_backend
         self.is_debug_mode = is_debug_mode
 
         self.n_surface_sampling = n_surface_sampling
@@ -257,40 +603,38 @@ class DataCreator(DataCreatorHelper):
             map_z_to_y=True, check_watertight=True, translate_mode=self.translate_mode, save_html=False
         )
 
-        cls = 0
-        for mesh in tqdm(meshes, desc="Preprocessing"):
-            normalized_mesh = self.get_normalized_mesh(mesh, max_length=max_length)
-
-            centralized_mesh = normalized_mesh.copy()
-            centralized_mesh.vertices += np.array([0.5, 0.5, 0])
-
-            if self.dynamic_sampling:
-                (
-                    self.n_surface_sampling,
-                    self.n_bbox_sampling,
-                    self.n_volume_sampling,
-                ) = Configuration.get_dynamic_sampling_size(mesh_vertices_count=mesh.vertices.shape[0])
-
-            print(
-                f"mesh_vertices_count: {mesh.vertices.shape[0]}",
-                f"n_total_sampling: {self.n_surface_sampling + self.n_bbox_sampling + self.n_volume_sampling}",
+        # Sort by path so that `cls` is assigned deterministically regardless of the loading order
+        meshes = sorted(meshes, key=lambda mesh: mesh.path)
+
+        # Each mesh gets its own seed, since forked workers share the global random state.
+        # Seeds follow `cls`, so `Configuration.set_seed` makes the output reproducible regardless of scheduling
+        seeds = np.random.SeedSequence(np.random.randint(np.iinfo(np.int32).max)).spawn(len(meshes))
+
+        tasks = [
+            (
+                mesh.vertices,
+                mesh.faces,
+                mesh.path,
+                cls,
+                max_length,
+                self.n_surface_sampling,
+                self.n_bbox_sampling,
+                self.n_volume_sampling,
+                self.dynamic_sampling,
+                self.save_path,
+                self.sdf_backend,
+                seeds[cls],
             )
+            for cls, mesh in enumerate(meshes)
+        ]
 
-            xyz = self.sample_pts(
-                centralized_mesh, self.n_surface_sampling, self.n_bbox_sampling, self.n_volume_sampling
-            )
-
-            sdf, *_ = pcu.signed_distance_to_mesh(xyz, centralized_mesh.vertices, centralized_mesh.faces)
-            sdf = np.expand_dims(sdf, axis=1)
-
-            cls_name = os.path.basename(mesh.path).split(".")[0]
-
-            np.savez(
-                os.path.join(self.save_path, f"{cls_name}.npz"),
-                xyz=xyz,
-                sdf=sdf,
-                cls=cls,
-                cls_name=cls_name,
-            )
+        if self.sdf_backend == DataCreatorHelper.KAOLIN and torch.cuda.is_available():
+            # CUDA cannot be initialized in forked workers, and the GPU already parallelizes the queries
+            for _ in tqdm(map(DataCreatorHelper.create_sdf_data, tasks), total=len(tasks), desc="Preprocessing"):
+                pass
 
-            cls += 1
+        else:
+            with multiprocessing.Pool(processes=multiprocessing.cpu_count(), initializer=_init_sdf_data_worker) as pool:
+                results = pool.imap_unordered(DataCreatorHelper.create_sdf_data, tasks)
+                for _ in tqdm(results, total=len(tasks), desc="Preprocessing"):
+                    pass
@@ -1,28 +1,35 @@
 import os
-import time
+import json
 import torch
 import random
+import trimesh
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 
 from tqdm import tqdm
 from collections import deque
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Union
 from IPython.display import clear_output
 from deep_sdf.src.model import SDFdecoder
 from deep_sdf.src import utils
 from deep_sdf.src.config import Configuration
 from deep_sdf.src.reconstruct import ReconstructorHelper
 
+# Seeded once from the OS entropy, so syntheses differ across runs even after `Configuration.set_seed`
+_rng = random.Random()
+
 
 class SynthesizerHelper:
+    MAX_PARENTS = 3
+
     @staticmethod
-    def interpolate(latent_codes: List[torch.Tensor], factors: List[float]) -> torch.Tensor:
+    def interpolate(latent_codes: Union[List[torch.Tensor], torch.Tensor], factors: List[float]) -> torch.Tensor:
         """Interpolate latent codes.
 
         Args:
-            latent_codes (List[torch.Tensor]): latent codes
+            latent_codes (Union[List[torch.Tensor], torch.Tensor]): latent codes, or them already stacked
             factors (List[float]): factors to interpolate
 
         Returns:
@@ -34,16 +41,256 @@ class SynthesizerHelper:
         if len(latent_codes) == 1:
             return latent_codes[0]
 
-        interpolated = latent_codes[0]
-        for fi, f in enumerate(factors):
-            interpolated = interpolated * (1 - f) + latent_codes[fi + 1] * f
+        # Weights of the chained interpolation `x = x * (1 - f) + latent_code * f` for each latent code
+        factors = np.array(factors, dtype=np.float64)
+        weights = np.append(1.0, factors) * np.append(np.cumprod((1 - factors)[::-1])[::-1], 1.0)
+
+        stacked_latent_codes = latent_codes if isinstance(latent_codes, torch.Tensor) else torch.stack(latent_codes)
+        weights = torch.tensor(weights, dtype=stacked_latent_codes.dtype, device=stacked_latent_codes.device)
+
+        return (weights[:, None] * stacked_latent_codes).sum(0)
 
-        return interpolated
+    @staticmethod
+    def get_synthesized_data_dtype(latent_size: int) -> np.dtype:
+        """Get the dtype of the structured array storing synthesized data. `parents` is padded with -1.
+
+        Args:
+            latent_size (int): size of each latent code
+
+        Returns:
+            np.dtype: dtype of synthesized data
+        """
+
+        return np.dtype(
+            [
+                ("name", "U64"),
+                ("index", "i4"),
+                ("synthesis_type", "U16"),
+                ("parents", "i4", (SynthesizerHelper.MAX_PARENTS,)),
+                ("latent_code", "f4", (latent_size,)),
+            ]
+        )
+
+    @staticmethod
+    def to_synthesized_data_array(data: List[dict], latent_size: int) -> np.ndarray:
+        """Convert synthesized data given as dicts to the structured array
+
+        Args:
+            data (List[dict]): synthesized data containing `latent_code`
+            latent_size (int): size of each latent code
+
+        Returns:
+            np.ndarray: synthesized data
+        """
+
+        synthesized_data = np.empty(len(data), dtype=SynthesizerHelper.get_synthesized_data_dtype(latent_size))
+
+        for i, d in enumerate(data):
+            parents = SynthesizerHelper.get_parents(d)
+            synthesized_data[i] = (
+                str(d["name"]),
+                d["index"],
+                d["synthesis_type"],
+                parents + [-1] * (SynthesizerHelper.MAX_PARENTS - len(parents)),
+                d["latent_code"],
+            )
+
+        return synthesized_data
+
+    @staticmethod
+    def get_latent_codes_data(synthesized_data: np.ndarray, device: str = Configuration.DEVICE) -> dict:
+        """Build latent codes data where all latent codes are stacked as a single tensor on the device.
+
+        Args:
+            synthesized_data (np.ndarray): synthesized data as the structured array
+            device (str, optional): device to keep latent codes. Defaults to Configuration.DEVICE.
+
+        Returns:
+            dict: latent codes data
+        """
+
+        return {
+            "data": synthesized_data.copy(),
+            "latent_codes": torch.tensor(synthesized_data["latent_code"], dtype=torch.float, device=device),
+            "size": synthesized_data.shape[0],
+        }
+
+    @staticmethod
+    def append_latent_code(latent_codes_data: dict, synthesized_data: dict, latent_code: torch.Tensor) -> None:
+        """Append the synthesized data to the latent codes data. Buffers grow by doubling.
+
+        Args:
+            latent_codes_data (dict): latent codes data
+            synthesized_data (dict): synthesized data to append
+            latent_code (torch.Tensor): synthesized latent code
+        """
+
+        size = latent_codes_data["size"]
+
+        if size == latent_codes_data["data"].shape[0]:
+            latent_codes_data["latent_codes"] = torch.cat(
+                [latent_codes_data["latent_codes"], torch.empty_like(latent_codes_data["latent_codes"])]
+            )
+            latent_codes_data["data"] = np.concatenate(
+                [latent_codes_data["data"], np.empty_like(latent_codes_data["data"])]
+            )
+
+        parents = synthesized_data["parents"]
+
+        latent_codes_data["latent_codes"][size] = latent_code
+        latent_codes_data["data"][size] = (
+            synthesized_data["name"],
+            synthesized_data["index"],
+            synthesized_data["synthesis_type"],
+            parents + [-1] * (SynthesizerHelper.MAX_PARENTS - len(parents)),
+            latent_code.detach().cpu().numpy(),
+        )
+        latent_codes_data["size"] += 1
+
+    @staticmethod
+    def get_candidate_indices(latent_codes_data: dict, synthesis_type_to_exclude: str, size: int = None) -> np.ndarray:
+        """Get indices of latent codes that can be sampled
+
+        Args:
+            latent_codes_data (dict): latent codes data
+            synthesis_type_to_exclude (str): synthesis type to exclude
+            size (int, optional): consider only the first `size` latent codes. Defaults to None.
+
+        Returns:
+            np.ndarray: candidate indices
+        """
+
+        if size is None:
+            size = latent_codes_data["size"]
+
+        return np.flatnonzero(latent_codes_data["data"]["synthesis_type"][:size] != synthesis_type_to_exclude)
+
+    @staticmethod
+    def get_parents(data: Union[dict, np.void]) -> List[int]:
+        """Get indices of the latent codes the given data was synthesized from.
+        Data saved before `parents` was stored is parsed from its name.
+
+        Args:
+            data (Union[dict, np.void]): synthesized data
+
+        Returns:
+            List[int]: parent indices
+        """
+
+        if isinstance(data, np.void):
+            return [int(p) for p in data["parents"] if p >= 0]
+
+        if "parents" in data:
+            return data["parents"]
+
+        if data["synthesis_type"] == "interpolation":
+            return [int(i) for i in data["name"].split("__")[:-1]]
+
+        if data["synthesis_type"] == "arithmetic":
+            return [int(i) for i in data["name"].replace(".obj", "").split("__")]
+
+        return []
+
+    @staticmethod
+    def write_synthesis_log(log_path: str, log_latent_codes_path: str, synthesized_data: np.ndarray) -> None:
+        """Append synthesized data to the append-only logs: metadata to .jsonl, latent codes to a raw float32 file
+
+        Args:
+            log_path (str): path to the .jsonl log
+            log_latent_codes_path (str): path to the latent codes log
+            synthesized_data (np.ndarray): synthesized data to append
+        """
+
+        # Metadata goes first, so an interruption can only leave records without latent codes,
+        # which `read_synthesis_log` drops
+        with open(log_path, "a") as f:
+            for d in synthesized_data:
+                metadata = {
+                    "name": str(d["name"]),
+                    "index": int(d["index"]),
+                    "synthesis_type": str(d["synthesis_type"]),
+                    "parents": SynthesizerHelper.get_parents(d),
+                }
+
+                f.write(json.dumps(metadata) + "\n")
+
+        with open(log_latent_codes_path, "ab") as f:
+            f.write(np.ascontiguousarray(synthesized_data["latent_code"], dtype=np.float32).tobytes())
+
+    @staticmethod
+    def read_synthesis_log(log_path: str, log_latent_codes_path: str, latent_size: int) -> np.ndarray:
+        """Read synthesized data from the append-only logs, truncating both logs to the records complete in both
+
+        Args:
+            log_path (str): path to the .jsonl log
+            log_latent_codes_path (str): path to the latent codes log
+            latent_size (int): size of each latent code
+
+        Returns:
+            np.ndarray: synthesized data
+        """
+
+        data = []
+        data_ends = [0]
+        with open(log_path, "rb") as f:
+            offset = 0
+            for line in f:
+                offset += len(line)
+                if not line.strip():
+                    continue
+
+                # Only the last line can be partially written
+                if not line.endswith(b"\n"):
+                    break
+
+                data.append(json.loads(line))
+                data_ends.append(offset)
+
+        latent_code_bytes = latent_size * np.dtype(np.float32).itemsize
+        latent_codes_bytes = os.path.getsize(log_latent_codes_path) if os.path.exists(log_latent_codes_path) else 0
+
+        # An interruption can leave records without latent codes, or a partially written latent code.
+        # Both logs are truncated to the complete records so that later appends stay aligned
+        size = min(len(data), latent_codes_bytes // latent_code_bytes)
+        data = data[:size]
+
+        with open(log_path, "ab") as f:
+            f.truncate(data_ends[size])
+
+        with open(log_latent_codes_path, "ab") as f:
+            f.truncate(size * latent_code_bytes)
+
+        latent_codes = np.fromfile(log_latent_codes_path, dtype=np.float32).reshape(-1, latent_size)
+
+        for d, latent_code in zip(data, latent_codes):
+            d["latent_code"] = latent_code
+
+        return SynthesizerHelper.to_synthesized_data_array(data, latent_size)
 
 
 class Synthesizer(ReconstructorHelper, SynthesizerHelper, Configuration):
     def __init__(self) -> None:
-        pass
+        self._volume_coords = None
+
+    def _get_cached_volume_coords(self, resolution: int) -> Tuple[torch.Tensor, int]:
+        """Get volume coords on the device. Only the grid of the last resolution is kept,
+        since it is constant across syntheses
+
+        Args:
+            resolution (int): resolution
+
+        Returns:
+            Tuple[torch.Tensor, int]: coords, grid size per axis
+        """
+
+        if self._volume_coords is None or self._volume_coords[0] != resolution:
+            # Drop the previous grid before allocating the new one
+            self._volume_coords = None
+            self._volume_coords = (resolution, *self.get_volume_coords(resolution=resolution))
+
+        _, coords, grid_size_axis = self._volume_coords
+
+        return coords, grid_size_axis
 
     def random_interpolation_synthesis(
         self, sdf_decoder: SDFdecoder, latent_codes_data: dict
@@ -58,29 +305,23 @@ class Synthesizer(ReconstructorHelper, SynthesizerHelper, Configuration):
             Tuple[int, int, float, torch.Tensor]: selected indices, interpolation factor, and synthesized latent code
         """
 
-        data_to_sample = latent_codes_data["data"]
-
-        if random.Random(time.time()).random() < 0.5:
-            data_to_sample = data_to_sample[: len(sdf_decoder.latent_codes)]
-
-        data_to_sample = [rd for rd in data_to_sample if rd["synthesis_type"] != "arithmetic"]
+        size = latent_codes_data["size"]
 
-        data_1, data_2 = random.Random(time.time()).sample(data_to_sample, 2)
+        if _rng.random() < 0.5:
+            size = min(size, len(sdf_decoder.latent_codes))
 
-        latent_code_1 = data_1["latent_code"]
-        latent_code_1 = torch.tensor(latent_code_1).to(sdf_decoder.latent_codes.device)
-        latent_code_1_index = data_1["index"]
+        candidate_indices = self.get_candidate_indices(latent_codes_data, "arithmetic", size=size)
 
-        latent_code_2 = data_2["latent_code"]
-        latent_code_2 = torch.tensor(latent_code_2).to(sdf_decoder.latent_codes.device)
-        latent_code_2_index = data_2["index"]
+        random_indices = candidate_indices[_rng.sample(range(len(candidate_indices)), 2)]
+        latent_code_1_index, latent_code_2_index = random_indices
 
         selected_indices = f"{latent_code_1_index}__{latent_code_2_index}"
 
-        random_interpolation_factor = round(0.25 + (0.75 - 0.25) * random.Random(time.time()).random(), 3)
+        random_interpolation_factor = round(0.25 + (0.75 - 0.25) * _rng.random(), 3)
 
         synthesized_latent_code = self.interpolate(
-            latent_codes=[latent_code_1, latent_code_2], factors=[random_interpolation_factor]
+            latent_codes=latent_codes_data["latent_codes"][torch.as_tensor(random_indices)],
+            factors=[random_interpolation_factor],
         )
 
         return selected_indices, random_interpolation_factor, synthesized_latent_code
@@ -98,27 +339,106 @@ class Synthesizer(ReconstructorHelper, SynthesizerHelper, Configuration):
             Tuple[str, torch.Tensor]: selected indices and synthesized latent code
         """
 
-        data_to_sample = latent_codes_data["data"]
+        size = latent_codes_data["size"]
 
-        if random.Random(time.time()).random() < 0.5:
-            data_to_sample = data_to_sample[: len(sdf_decoder.latent_codes)]
+        if _rng.random() < 0.5:
+            size = min(size, len(sdf_decoder.latent_codes))
 
-        data_to_sample = [rd for rd in data_to_sample if rd["synthesis_type"] != "interpolation"]
+        candidate_indices = self.get_candidate_indices(latent_codes_data, "interpolation", size=size)
 
-        random_data = random.Random(time.time()).sample(data_to_sample, 3)
+        random_indices = candidate_indices[_rng.sample(range(len(candidate_indices)), 3)]
 
-        selected_indices = str(random_data[0]["index"])
-        synthesized_latent_code = torch.tensor(random_data[0]["latent_code"]).to(sdf_decoder.latent_codes.device)
-        for rdi, rd in enumerate(random_data[1:]):
-            if rdi != len(random_data[1:]) - 1:
-                synthesized_latent_code += torch.tensor(rd["latent_code"]).to(sdf_decoder.latent_codes.device)
-            else:
-                synthesized_latent_code -= torch.tensor(rd["latent_code"]).to(sdf_decoder.latent_codes.device)
+        selected_indices = "__".join(str(ri) for ri in random_indices)
 
-            selected_indices += "__" + str(rd["index"])
+        # `latent_code_1 + latent_code_2 - latent_code_3` as a single signed sum over the gathered rows
+        latent_codes = latent_codes_data["latent_codes"]
+        signs = torch.tensor([1.0, 1.0, -1.0], dtype=latent_codes.dtype, device=latent_codes.device)
+        synthesized_latent_code = (latent_codes[torch.as_tensor(random_indices)] * signs[:, None]).sum(0)
 
         return selected_indices, synthesized_latent_code
 
+    @torch.inference_mode()
+    def _forward(
+        self,
+        sdf_decoder: SDFdecoder,
+        latent_code: torch.Tensor,
+        resolution: int = Configuration.RECONSTRUCT_RESOLUTION,
+        use_autocast: bool = False,
+    ) -> Tuple[torch.Tensor, int]:
+        """Predict sdf values of the volume grid for the given latent code
+
+        Args:
+            sdf_decoder (SDFdecoder): model
+            latent_code (torch.Tensor): latent code
+            resolution (int, optional): resolution for reconstruction. Defaults to Configuration.RECONSTRUCT_RESOLUTION.
+            use_autocast (bool, optional): run the decoder in bfloat16 with autocast on CUDA devices supporting it.
+                bfloat16 rounds the coordinates to 2^-8 in [0.5, 1), so neighbouring grid points collapse above
+                resolution 256. Defaults to False.
+
+        Returns:
+            Tuple[torch.Tensor, int]: sdf values on the cpu, grid size per axis
+        """
+
+        coords, grid_size_axis = self._get_cached_volume_coords(resolution)
+        coords_batches = torch.split(coords, self.RECONSTRUCT_BATCH_SIZE)
+        offsets = np.cumsum([0] + [coords_batch.shape[0] for coords_batch in coords_batches])
+
+        sdf = torch.empty((coords.shape[0], 1), device=self.DEVICE)
+
+        # bfloat16 is slower than float32 on CPUs without native support
+        use_autocast = use_autocast and self.DEVICE == "cuda" and torch.cuda.is_bf16_supported()
+
+        # The latent code is the same for all points, so it is written into the buffer only once
+        latent_size = latent_code.shape[0]
+        cxyz_1_buffer = torch.empty((self.RECONSTRUCT_BATCH_SIZE, latent_size + 3), device=self.DEVICE)
+        cxyz_1_buffer[:, :latent_size].copy_(latent_code.expand(self.RECONSTRUCT_BATCH_SIZE, -1))
+
+        with torch.autocast(device_type=self.DEVICE, dtype=torch.bfloat16, enabled=use_autocast):
+            for i, coords_batch in enumerate(tqdm(coords_batches, desc="Synthesizing ... ", leave=False)):
+                cxyz_1 = cxyz_1_buffer[: coords_batch.shape[0]]
+                cxyz_1[:, latent_size:] = coords_batch
+
+                # `sdf` stays in float32 for marching cubes
+                sdf[offsets[i] : offsets[i + 1]] = sdf_decoder(None, None, cxyz_1)
+
+        return sdf.cpu(), grid_size_axis
+
+    def _extract(
+        self,
+        sdf: torch.Tensor,
+        grid_size_axis: int,
+        save_name: str = None,
+        normalize: bool = True,
+        map_z_to_y: bool = False,
+        check_watertight: bool = False,
+    ) -> trimesh.Trimesh:
+        """Extract the mesh from the predicted sdf values and save it
+
+        Args:
+            sdf (torch.Tensor): sdf values
+            grid_size_axis (int): grid size per axis
+            save_name (str, optional): save name. Defaults to None.
+            normalize (bool, optional): normalize. Defaults to True.
+            map_z_to_y (bool, optional): map z to y. Defaults to False.
+            check_watertight (bool, optional): whether check watertight. Defaults to False.
+
+        Returns:
+            trimesh.Trimesh: extracted mesh
+        """
+
+        mesh = self.extract_mesh(
+            grid_size_axis=grid_size_axis,
+            sdf=sdf,
+            normalize=normalize,
+            map_z_to_y=map_z_to_y,
+            check_watertight=check_watertight,
+        )
+
+        if mesh is not None and save_name is not None:
+            mesh.export(save_name)
+
+        return mesh
+
     @torch.inference_mode()
     @utils.runtime_calculator
     def synthesize(
@@ -130,6 +450,7 @@ class Synthesizer(ReconstructorHelper, SynthesizerHelper, Configuration):
         normalize: bool = True,
         map_z_to_y: bool = False,
         check_watertight: bool = False,
+        use_autocast: bool = False,
     ):
         """Synthesize skyscrapers
 
@@ -158,37 +479,25 @@ class Synthesizer(ReconstructorHelper, SynthesizerHelper, Configuration):
             resolution (int, optional): resolution for reconstruction. Defaults to Configuration.RECONSTRUCT_RESOLUTION.
             normalize (bool, optional): normalize. Defaults to True.
             map_z_to_y (bool, optional): map z to y. Defaults to False.
+            check_watertight (bool, optional): whether check watertight. Defaults to False.
+            use_autocast (bool, optional): run the decoder in bfloat16 with autocast on CUDA devices supporting it.
+                bfloat16 rounds the coordinates to 2^-8 in [0.5, 1), so neighbouring grid points collapse above
+                resolution 256. Defaults to False.
         """
 
-        coords, grid_size_axis = self.get_volume_coords(resolution=resolution)
-        coords.to(self.DEVICE)
-        coords_batches = torch.split(coords, coords.shape[0] // 1000)
-
-        sdf = torch.tensor([]).to(self.DEVICE)
-
-        for coords_batch in tqdm(coords_batches, desc="Synthesizing ... ", leave=False):
-            interpolated_repeat = latent_code.unsqueeze(1).repeat(1, coords_batch.shape[0]).transpose(0, 1)
-            cxyz_1 = torch.cat([interpolated_repeat, coords_batch], dim=1)
-            pred = sdf_decoder(None, None, cxyz_1)
-
-            if sum(sdf.shape) == 0:
-                sdf = pred
-            else:
-                sdf = torch.vstack([sdf, pred])
+        sdf, grid_size_axis = self._forward(
+            sdf_decoder=sdf_decoder, latent_code=latent_code, resolution=resolution, use_autocast=use_autocast
+        )
 
-        mesh = self.extract_mesh(
-            grid_size_axis=grid_size_axis,
+        return self._extract(
             sdf=sdf,
+            grid_size_axis=grid_size_axis,
+            save_name=save_name,
             normalize=normalize,
             map_z_to_y=map_z_to_y,
             check_watertight=check_watertight,
         )
 
-        if mesh is not None and save_name is not None:
-            mesh.export(save_name)
-
-        return mesh
-
 
 def infinite_synthesis(
     sdf_decoder: SDFdecoder,
@@ -197,6 +506,8 @@ def infinite_synthesis(
     resolution: int = 128,
     map_z_to_y: bool = True,
     check_watertight: bool = True,
+    checkpoint_interval: int = 100,
+    use_autocast: bool = True,
 ) -> None:
     """Synthesize 3d models
 
@@ -207,6 +518,9 @@ def infinite_synthesis(
         resolution (int, optional): resolution. Defaults to 128.
         map_z_to_y (bool, optional): whether map z to y. Defaults to True.
         check_watertight (bool, optional): whether check watertight. Defaults to True.
+        checkpoint_interval (int, optional): interval to save all synthesized data as .npz. Defaults to 100.
+        use_autocast (bool, optional): run the decoder in bfloat16 with autocast on CUDA devices supporting it.
+            bfloat16 still resolves the grid step up to resolution 256. Defaults to True.
     """
 
     synthesizer = Synthesizer()
@@ -214,79 +528,162 @@ def infinite_synthesis(
     synthesized_latent_codes_npz = "infinite_synthesized_latent_codes.npz"
     synthesized_latent_codes_path = os.path.join(save_dir, synthesized_latent_codes_npz)
 
+    # Append-only logs updated on every synthesis, the .npz above is only a checkpoint
+    synthesized_log_path = os.path.join(save_dir, "infinite_synthesized_log.jsonl")
+    synthesized_log_latent_codes_path = os.path.join(save_dir, "infinite_synthesized_log_latent_codes.bin")
+
     os.makedirs(save_dir, exist_ok=True)
 
-    synthesized_latent_codes = {
-        "data": [
-            {
-                "name": i,
-                "index": i,
-                "synthesis_type": "initial",
-                "latent_code": list(latent_code.detach().cpu().numpy()),
-            }
-            for i, latent_code in enumerate(sdf_decoder.latent_codes)
-        ]
-    }
+    latent_size = sdf_decoder.latent_codes.shape[1]
 
-    if os.path.exists(synthesized_latent_codes_path):
-        synthesized_latent_codes = {
-            "data": list(np.load(synthesized_latent_codes_path, allow_pickle=True)["synthesized_data"])
-        }
+    synthesized_data_array = None
+    if os.path.exists(synthesized_log_path):
+        synthesized_data_array = synthesizer.read_synthesis_log(
+            synthesized_log_path, synthesized_log_latent_codes_path, latent_size=latent_size
+        )
 
-    while len(synthesized_latent_codes["data"]) < synthesis_count:
-        print("synthesized data length:", len(synthesized_latent_codes["data"]))
+        # Logs holding fewer records than the initial latent codes are left by an interrupted seeding, so seed again
+        if synthesized_data_array.shape[0] < len(sdf_decoder.latent_codes):
+            synthesized_data_array = None
 
-        if random.Random(time.time()).random() < 0.5:
-            selected_indices, synthesized_latent_code = synthesizer.random_arithmetic_operations_synthesis(
-                sdf_decoder=sdf_decoder, latent_codes_data=synthesized_latent_codes
+    if synthesized_data_array is None:
+        if os.path.exists(synthesized_latent_codes_path):
+            synthesized_data_array = np.load(synthesized_latent_codes_path, allow_pickle=True)["synthesized_data"]
+
+            # Data saved as pickled dicts before the structured array is converted once here
+            if synthesized_data_array.dtype == object:
+                synthesized_data_array = synthesizer.to_synthesized_data_array(
+                    list(synthesized_data_array), latent_size=latent_size
+                )
+
+        else:
+            synthesized_data_array = synthesizer.to_synthesized_data_array(
+                [
+                    {
+                        "name": i,
+                        "index": i,
+                        "synthesis_type": "initial",
+                        "parents": [],
+                        "latent_code": latent_code.detach().cpu().numpy(),
+                    }
+                    for i, latent_code in enumerate(sdf_decoder.latent_codes)
+                ],
+                latent_size=latent_size,
             )
 
-            synthesis_type = "arithmetic"
+        # The seed is written to temporary logs moved into place, the .jsonl last since its existence marks a
+        # completed seeding, so that an interruption never leaves partially seeded logs
+        temp_log_path = f"{synthesized_log_path}.tmp"
+        temp_log_latent_codes_path = f"{synthesized_log_latent_codes_path}.tmp"
+        for temp_path in (temp_log_path, temp_log_latent_codes_path):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
-            name = f"{selected_indices}.obj"
-            save_name = os.path.join(save_dir, name)
+        synthesizer.write_synthesis_log(temp_log_path, temp_log_latent_codes_path, synthesized_data_array)
 
-        else:
-            (
-                selected_indices,
-                random_interpolation_factor,
-                synthesized_latent_code,
-            ) = synthesizer.random_interpolation_synthesis(
-                sdf_decoder=sdf_decoder, latent_codes_data=synthesized_latent_codes
+        os.replace(temp_log_latent_codes_path, synthesized_log_latent_codes_path)
+        os.replace(temp_log_path, synthesized_log_path)
+
+    synthesized_latent_codes = synthesizer.get_latent_codes_data(
+        synthesized_data_array, device=sdf_decoder.latent_codes.device
+    )
+
+    # Meshes are extracted on a worker thread while the decoder predicts the next synthesis
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = None
+    future_save_name = None
+    is_exception_raised = False
+
+    try:
+        while synthesized_latent_codes["size"] < synthesis_count:
+            print("synthesized data length:", synthesized_latent_codes["size"])
+
+            if _rng.random() < 0.5:
+                selected_indices, synthesized_latent_code = synthesizer.random_arithmetic_operations_synthesis(
+                    sdf_decoder=sdf_decoder, latent_codes_data=synthesized_latent_codes
+                )
+
+                synthesis_type = "arithmetic"
+
+                name = f"{selected_indices}.obj"
+                save_name = os.path.join(save_dir, name)
+
+            else:
+                (
+                    selected_indices,
+                    random_interpolation_factor,
+                    synthesized_latent_code,
+                ) = synthesizer.random_interpolation_synthesis(
+                    sdf_decoder=sdf_decoder, latent_codes_data=synthesized_latent_codes
+                )
+
+                synthesis_type = "interpolation"
+
+                name = f"{selected_indices}__{str(random_interpolation_factor).replace('.', '-')}.obj"
+                save_name = os.path.join(save_dir, name)
+
+            if os.path.exists(save_name) or save_name == future_save_name:
+                continue
+
+            sdf, grid_size_axis = synthesizer._forward(
+                sdf_decoder=sdf_decoder,
+                latent_code=synthesized_latent_code,
+                resolution=resolution,
+                use_autocast=use_autocast,
             )
 
-            synthesis_type = "interpolation"
+            if future is not None:
+                future.result()
 
-            name = f"{selected_indices}__{str(random_interpolation_factor).replace('.', '-')}.obj"
-            save_name = os.path.join(save_dir, name)
+            future = executor.submit(
+                synthesizer._extract,
+                sdf=sdf,
+                grid_size_axis=grid_size_axis,
+                save_name=save_name,
+                map_z_to_y=map_z_to_y,
+                check_watertight=check_watertight,
+            )
+            future_save_name = save_name
 
-        if os.path.exists(save_name):
-            continue
+            index = synthesized_latent_codes["size"]
 
-        _ = synthesizer.synthesize(
-            sdf_decoder=sdf_decoder,
-            latent_code=synthesized_latent_code,
-            resolution=resolution,
-            save_name=save_name,
-            map_z_to_y=map_z_to_y,
-            check_watertight=check_watertight,
-        )
+            synthesized_data = {
+                "name": name,
+                "index": index,
+                "synthesis_type": synthesis_type,
+                "parents": [int(i) for i in selected_indices.split("__")],
+            }
 
-        synthesized_data = {
-            "name": name,
-            "index": len(synthesized_latent_codes["data"]),
-            "synthesis_type": synthesis_type,
-            "latent_code": list(synthesized_latent_code.detach().cpu().numpy()),
-        }
+            synthesizer.append_latent_code(synthesized_latent_codes, synthesized_data, synthesized_latent_code)
+            synthesizer.write_synthesis_log(
+                synthesized_log_path,
+                synthesized_log_latent_codes_path,
+                synthesized_latent_codes["data"][index : index + 1],
+            )
 
-        synthesized_latent_codes["data"].append(synthesized_data)
+            if synthesized_latent_codes["size"] % checkpoint_interval == 0:
+                np.savez(
+                    synthesized_latent_codes_path,
+                    synthesized_data=synthesized_latent_codes["data"][: synthesized_latent_codes["size"]],
+                )
+
+            clear_output(wait=False)
+
+    except BaseException:
+        is_exception_raised = True
+        raise
+
+    finally:
+        executor.shutdown(wait=True)
 
         np.savez(
             synthesized_latent_codes_path,
-            synthesized_data=np.array(synthesized_latent_codes["data"]),
+            synthesized_data=synthesized_latent_codes["data"][: synthesized_latent_codes["size"]],
         )
 
-        clear_output(wait=False)
+        # Raise the failure of the last extraction, unless it would hide the exception already raised
+        if future is not None and not is_exception_raised:
+            future.result()
 
 
 def trace_back_to_origin(latent_codes_data: np.ndarray, index: int) -> List[dict]:
@@ -306,20 +703,10 @@ def trace_back_to_origin(latent_codes_data: np.ndarray, index: int) -> List[dict
     while queue:
         current_index = queue.popleft()
         current_data = latent_codes_data[current_index]
-        synthesis_type = current_data["synthesis_type"]
 
         traced_data.append(current_data)
 
-        if synthesis_type == "initial":
-            continue
-
-        elif synthesis_type == "interpolation":
-            indices = [int(i) for i in current_data["name"].split("__")[:-1]]
-
-        elif synthesis_type == "arithmetic":
-            indices = [int(i.replace(".obj", "")) for i in current_data["name"].split("__")]
-
-        queue.extend(indices)
+        queue.extend(SynthesizerHelper.get_parents(current_data))
 
     return traced_data
 
@@ -336,14 +723,11 @@ def visualize_traced_data_as_graph(latent_codes_data: np.ndarray, index: int):
     graph = nx.DiGraph()
 
     for data in traced_data:
-        current_index = data["index"]
+        current_index = int(data["index"])
         graph.add_node(current_index, label=data["index"])
 
-        synthesis_type = data["synthesis_type"]
-        if synthesis_type != "initial":
-            indices = [int(i.replace(".obj", "")) for i in data["name"].split("__") if i.replace(".obj", "").isdigit()]
-            for idx in indices:
-                graph.add_edge(idx, current_index)
+        for idx in SynthesizerHelper.get_parents(data):
+            graph.add_edge(idx, current_index)
 
     labels = nx.get_node_attributes(graph, "label")
 